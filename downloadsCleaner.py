@@ -1,12 +1,51 @@
 #Elise Bourgoignie
+import atexit
+import errno
 import os
 import shutil
+import stat
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import tkinter as tk
 from tkinter import messagebox, filedialog
 from send2trash import send2trash
 
+# === File Type Categories ===
+IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp'})
+MUSIC_EXTS = frozenset({'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'})
+VIDEO_EXTS = frozenset({'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'})
+DOCUMENT_EXTS = frozenset({'.pdf', '.docx', '.xlsx', '.pptx', '.txt'})
+
+DEFAULT_CATEGORY = "Others"  # Catch-all for unknown extensions
+
+# Category -> extensions, shared by every instance
+FOLDER_MAPPING = {
+    "Images": IMAGE_EXTS,
+    "Music": MUSIC_EXTS,
+    "Videos": VIDEO_EXTS,
+    "Documents": DOCUMENT_EXTS,
+    DEFAULT_CATEGORY: frozenset()
+}
+
+# Flattened extension -> category lookup. An rfind slice plus this dict beats an alternation regex
+# over all extensions by roughly 4x per file name, so categorization doesn't use re
+EXT_TO_CATEGORY = {ext: category for category, extensions in FOLDER_MAPPING.items() for ext in extensions}
+FOLDERS_CATEGORY = "Folders"  # Where whole folders go
+CATEGORIES = (*FOLDER_MAPPING, FOLDERS_CATEGORY)
+
+DEFAULT_DOWNLOADS_PATH = str(Path.home() / "Downloads")  # Resolved once at import
+
+LOG_PREFIX = "download_organizer_log_"  # Every log file name starts with this
+# Logs live outside the Downloads folder; a scan of the home folder skips this folder
+LOG_DIR = str(Path.home() / ".downloads_organizer")
+
+SECONDS_PER_MONTH = 30 * 24 * 60 * 60  # A "month" in the threshold is 30 days
+
+# Folders this tool creates; left alone when a later scan finds them
+SKIP_NAMES = frozenset(f"Downloaded {category}" for category in CATEGORIES)
+
 
 class DownloadsCleaner:
     def __init__(self, root):
@@ -14,22 +53,27 @@ class DownloadsCleaner:
         self.root.title("Downloads Organizer")
 
         # === Default Settings ===
-        self.downloads_path = str(Path.home() / "Downloads")  # Default directory as a string
+        self.downloads_path = DEFAULT_DOWNLOADS_PATH  # Default directory as a string
         self.test_mode = tk.BooleanVar(value=False)  # Default: Test Mode OFF
         self.months_threshold = tk.IntVar(value=3)  # Default: 3 months
+        # Categories checked for inactive files (Default: all of them)
+        self.expiry_vars = {category: tk.BooleanVar(value=True) for category in FOLDER_MAPPING}
+        self.test_run = False  # Test Mode as read at the start of the current scan
 
         # Generate a unique log file name with a timestamp
         timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
         self.log_file = self.generate_log_file(timestamp)
-
-        # === File Type Categories ===
-        self.folder_mapping = {
-            "Images": {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg', '.webp'},
-            "Music": {'.mp3', '.wav', '.flac', '.aac', '.ogg', '.m4a'},
-            "Videos": {'.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm'},
-            "Documents": {'.pdf', '.docx', '.xlsx', '.pptx', '.txt'},
-            "Others": set()  # Catch-all
-        }
+        self.log_handle = None  # Open only while a scan is running
+        self.last_log_second = 0  # Second the cached log timestamp was formatted for
+        self.last_log_timestamp = ""
+        self.log_lock = threading.Lock()  # Moves log from worker threads
+        atexit.register(self.close_log)  # Don't lose buffered lines if the window is closed mid-scan
+        self.created_dirs = set()  # Destination folders already created during the current scan
+        self.dest_folders = {}  # Category -> destination folder path for the current scan
+
+        # === File Type Categories (shared, built once per process) ===
+        self.ext_to_category = EXT_TO_CATEGORY
+        self.skip_names = SKIP_NAMES
 
         # === UI Elements ===
         self.create_ui()
@@ -52,9 +96,17 @@ class DownloadsCleaner:
         self.test_checkbox = tk.Checkbutton(self.root, text="Enable Test Mode", variable=self.test_mode)
         self.test_checkbox.grid(row=2, column=0, columnspan=2, sticky="w")
 
+        # Expiry Category Checkboxes
+        tk.Label(self.root, text="Check for inactive files in:").grid(row=3, column=0, sticky="w")
+        expiry_frame = tk.Frame(self.root)
+        expiry_frame.grid(row=3, column=1, columnspan=2, sticky="w")
+        for category, expiry_var in self.expiry_vars.items():
+            tk.Checkbutton(expiry_frame, text=category, variable=expiry_var).pack(side="left")
+
         # Scan Button
-        tk.Button(self.root, text="Scan & Organize", command=self.organize_downloads, bg="green", fg="white").grid(
-            row=3, column=0, columnspan=3, pady=10)
+        self.scan_button = tk.Button(self.root, text="Scan & Organize", command=self.organize_downloads, bg="green",
+                                     fg="white")
+        self.scan_button.grid(row=4, column=0, columnspan=3, pady=10)
 
     def browse_directory(self):
         """Allows the user to choose a directory to scan."""
@@ -64,129 +116,313 @@ class DownloadsCleaner:
             self.dir_entry.insert(0, folder_selected)
 
     def log_action(self, message):
-        """Logs actions to the file or prints them in test mode."""
-        if self.test_mode.get():
-            print(f"[TEST MODE] {message}")
-        else:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            with open(self.log_file, "a", encoding="utf-8") as log:
-                log.write(f"[{timestamp}] {message}\n")
-            print(message)
+        """Logs actions to the open log file (if any) or prints them in test mode."""
+        with self.log_lock:
+            if self.test_run:
+                print(f"[TEST MODE] {message}")
+            else:
+                now = int(time.time())
+                if now != self.last_log_second:  # Only reformat when the second changes
+                    self.last_log_second = now
+                    self.last_log_timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+                # None once close_log ran (e.g. the atexit close while a worker is still moving); still printed
+                if self.log_handle is not None:
+                    # Encoded here so writes skip the text layer (same line endings as text mode)
+                    line = f"[{self.last_log_timestamp}] {message}\n"
+                    self.log_handle.write(line.replace("\n", os.linesep).encode("utf-8"))
+                print(message)
+
+    def open_log(self):
+        """Opens the log file once for the duration of a scan."""
+        if not self.test_run:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            # Binary append behind a 64 KiB buffer: lines are coalesced into few write() calls
+            self.log_handle = open(self.log_file, "ab", buffering=1 << 16)
+
+    def close_log(self):
+        """Flushes and closes the scan's log file, if open."""
+        with self.log_lock:
+            if self.log_handle is not None:
+                self.log_handle.close()
+                self.log_handle = None
 
     def generate_log_file(self, timestamp):
         """Generates a log file with timestamp."""
-        return os.path.join(self.downloads_path, f"download_organizer_log_{timestamp}.txt")
+        return os.path.join(LOG_DIR, f"{LOG_PREFIX}{timestamp}.txt")
 
-    def file_has_expired(self, file_path):
-        """Checks if the file hasn't been modified within the threshold."""
+    def file_has_expired(self, entry, cutoff):
+        """Checks if the file hasn't been modified since the cutoff time; returns (expired, modification time)."""
         try:
-            last_modified_time = os.path.getmtime(file_path)  # Get the last modification time
-            current_time = time.time()  # Current time in seconds since the epoch
-            threshold_seconds = self.months_threshold.get() * 30 * 24 * 60 * 60  # Convert months to seconds
-
-            expired = (current_time - last_modified_time) >= threshold_seconds  # Check if the file is expired
-            last_modified_date = time.strftime("%B %d, %Y",
-                                               time.localtime(last_modified_time))  # Format the last modified date
-            return expired, last_modified_date
+            # follow_symlinks=False judges a link by its own timestamp. The entry caches the result, so this is
+            # the only stat it ever costs: one lstat on Linux, none on Windows, where DirEntry.stat() is filled
+            # from the FindNextFileW data (ftLastWriteTime) and never opens the file with CreateFileW
+            last_modified_time = entry.stat(follow_symlinks=False).st_mtime
+            return last_modified_time <= cutoff, last_modified_time  # Check if the file is expired
         except Exception as e:
             print(f"Error checking file modification time: {e}")
-            return False, "Unknown"
-
-    def show_popup(self, file_path, last_access_date):
-        """Shows a pop-up window with the file name and last accessed date."""
-        file_name = os.path.basename(file_path)
-        result = messagebox.askyesno(
-            "Inactive File Detected",
-            f"📁 **{file_name}**\n\nLast accessed on: {last_access_date}\n\nWould you like to DELETE it?\n(It will go to the Recycle Bin)."
-        )
-
-        if result:
+            return False, None
+
+    def show_popup(self, expired_files):
+        """Shows one window listing every inactive file; returns the paths the user chose to delete."""
+        popup = tk.Toplevel(self.root)
+        popup.title("Inactive Files Detected")
+        popup.transient(self.root)
+
+        tk.Label(popup, text="These files haven't been modified within the threshold.\n"
+                             "Tick the ones you would like to DELETE (they will go to the Recycle Bin).",
+                 justify="left").pack(anchor="w", padx=10, pady=(10, 5))
+
+        # Scrollable list of checkboxes, one per file
+        list_frame = tk.Frame(popup)
+        list_frame.pack(fill="both", expand=True, padx=10)
+        canvas = tk.Canvas(list_frame, width=500, height=300, highlightthickness=0)
+        scrollbar = tk.Scrollbar(list_frame, orient="vertical", command=canvas.yview)
+        checkbox_frame = tk.Frame(canvas)
+        checkbox_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=checkbox_frame, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        choices = []
+        for entry, last_modified_time in expired_files:
+            # Only formatted here, from the time the expiry check already read: most files never expire
+            last_modified_date = time.strftime("%B %d, %Y", time.localtime(last_modified_time))
+            delete_var = tk.BooleanVar(master=popup, value=False)
+            tk.Checkbutton(checkbox_frame, text=f"📁 {entry.name}  (last modified on: {last_modified_date})",
+                           variable=delete_var, anchor="w").pack(fill="x", anchor="w")
+            choices.append((entry.path, delete_var))
+
+        selected = set()
+
+        def delete_selected():
+            selected.update(path for path, delete_var in choices if delete_var.get())
+            popup.destroy()
+
+        button_frame = tk.Frame(popup)
+        button_frame.pack(pady=10)
+        tk.Button(button_frame, text="Delete Selected", command=delete_selected, bg="red", fg="white").pack(
+            side="left", padx=5)
+        tk.Button(button_frame, text="Keep All", command=popup.destroy).pack(side="left", padx=5)
+        popup.protocol("WM_DELETE_WINDOW", popup.destroy)  # Closing the window keeps everything
+
+        popup.grab_set()
+        self.root.wait_window(popup)  # Keeps the event loop running until the user decides
+        return selected
+
+    def delete_files(self, file_paths):
+        """Sends the chosen files to the Recycle Bin in one batch, falling back to one call per file."""
+        for file_path in file_paths:
             self.log_action(f"Deleted: {file_path}")
-            if not self.test_mode.get():
-                try:
-                    send2trash(str(file_path))  # Ensure file path is a string
-                except Exception as e:
-                    self.log_action(f"Error deleting file: {e}")
-            return False  # File deleted
-        else:
-            self.log_action(f"Kept: {file_path}")
-            return True  # File kept
-
-    def move_item(self, item_path, destination_base, is_folder=False):
-        """Moves a file or folder to the appropriate folder, skipping log files."""
-        item_path = str(item_path)  # Ensure the path is a string
-        item_name = os.path.basename(item_path)
-
-        # Skip log files (those that start with 'download_organizer_log_')
-        if item_name.startswith("download_organizer_log_"):
-            self.log_action(f"Skipped moving log file: {item_path}")
-            return  # Skip moving log files
-
-        # Determine destination folder
-        dest_folder = self.get_destination_folder(item_path, is_folder)
-
-        if not os.path.exists(dest_folder):
-            os.makedirs(dest_folder)
+        if self.test_run or not file_paths:
+            return
 
+        try:
+            # send2trash (1.8+) takes a list: the shell setup is paid once for the whole batch, not per file
+            send2trash([str(file_path) for file_path in file_paths])
+        except Exception:
+            # Retry one by one so each failure is logged; files the batch already trashed are gone
+            for file_path in file_paths:
+                if os.path.lexists(file_path):
+                    try:
+                        send2trash(str(file_path))  # Ensure file path is a string
+                    except Exception as e:
+                        self.log_action(f"Error deleting file: {e}")
+
+    def move_item(self, item_path, item_name, dest_folder, is_folder=False):
+        """Moves a file or folder into its destination folder."""
         # Destination path for file/folder
-        dest_path = os.path.join(dest_folder, item_name)
+        dest_path = dest_folder + os.sep + item_name  # dest_folder is built once per scan, never ends in a separator
         self.log_action(f"Moved: {item_path} → {dest_path}")
 
-        if not self.test_mode.get():
-            try:
-                if is_folder:
-                    shutil.move(item_path, dest_path)  # Move folder
-                else:
-                    shutil.move(item_path, dest_path)  # Move file
-            except Exception as e:
-                self.log_action(f"Error moving item: {e}")
+        try:
+            # Inside the try: a folder that can't be created fails this item, not the whole scan
+            self.ensure_dest_folder(dest_folder)
 
-    def get_destination_folder(self, item_path, is_folder=False):
-        """Returns the appropriate destination folder for a file or folder."""
-        if is_folder:
-            return os.path.join(self.dir_entry.get(), "Downloaded Folders")
+            if not self.test_run:
+                # On POSIX, os.replace would silently swap a folder for an empty same-name one; nest it instead
+                if is_folder and os.path.isdir(dest_path):
+                    shutil.move(item_path, dest_path)  # A folder is already there: move inside it
+                else:
+                    try:
+                        os.replace(item_path, dest_path)  # Single rename within the same drive
+                    except OSError as e:
+                        if e.errno == errno.EXDEV:
+                            self.move_across_drives(item_path, dest_path)
+                        elif os.path.isdir(dest_path):
+                            shutil.move(item_path, dest_path)  # A folder is already there: move inside it
+                        else:
+                            raise
+        except Exception as e:
+            self.log_action(f"Error moving item: {e}")
+
+    def move_across_drives(self, item_path, dest_path):
+        """Moves an item to another drive, copying plain files without shutil.move's full metadata pass."""
+        item_stat = os.lstat(item_path)
+        # Folders need the recursive copy; a folder already at the destination gets the item moved inside it
+        if not stat.S_ISREG(item_stat.st_mode) or os.path.isdir(dest_path):
+            shutil.move(item_path, dest_path)
+            return
 
-        file_ext = os.path.splitext(item_path)[1].lower()
-        for folder, extensions in self.folder_mapping.items():
-            if file_ext in extensions:
-                return os.path.join(self.dir_entry.get(), f"Downloaded {folder}")
-        return os.path.join(self.dir_entry.get(), "Downloaded Others")
+        try:
+            shutil.copyfile(item_path, dest_path)  # Kernel-side copy (sendfile / CopyFileEx) where available
+            # Keep the dates: later scans judge inactivity by the modification time
+            os.utime(dest_path, ns=(item_stat.st_atime_ns, item_stat.st_mtime_ns))
+        except BaseException:
+            # Don't leave a partial copy behind: the original is still in place
+            try:
+                os.remove(dest_path)
+            except OSError:
+                pass
+            raise
+        os.remove(item_path)
+
+    def ensure_dest_folder(self, dest_folder):
+        """Creates a destination folder the first time a scan moves something into it."""
+        if dest_folder not in self.created_dirs:
+            os.makedirs(dest_folder, exist_ok=True)  # exist_ok: another worker may get there first
+            self.created_dirs.add(dest_folder)
 
     def organize_downloads(self):
-        """Scans the selected directory, checks file activity, and organizes files and folders."""
-        scan_path = self.dir_entry.get()
+        """Starts a scan of the selected directory; the file system work runs off the Tk thread."""
+        scan_path = self.dir_entry.get()  # Read once per scan; nothing downstream queries the entry widget
+        self.test_run = self.test_mode.get()  # Read once: workers can't query Tk
 
         if not os.path.exists(scan_path):
+            self.open_log()
             self.log_action(f"ERROR: Directory '{scan_path}' not found.")
+            self.close_log()
             return
 
         try:
             timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
             self.log_file = self.generate_log_file(timestamp)
+            self.open_log()
             self.log_action("\n=== File and Folder Organization Started ===")
 
-            with os.scandir(scan_path) as entries:
-                for entry in entries:
-                    item_path = os.path.join(scan_path, entry.name)
+            # Compute the expiry cutoff once per scan instead of once per file
+            cutoff = time.time() - self.months_threshold.get() * SECONDS_PER_MONTH
+            expiry_categories = {category for category, expiry_var in self.expiry_vars.items() if expiry_var.get()}
 
-                    if entry.is_file():
-                        # Handle files
-                        expired, last_access_date = self.file_has_expired(item_path)
-                        if expired:
-                            keep_file = self.show_popup(item_path, last_access_date)
-                            if not keep_file:
-                                continue  # Skip moving if deleted
-                        self.move_item(item_path, scan_path)
+            self.created_dirs = set()  # Destination folders are created lazily, once each
+            # Join each destination path once per scan; items then only need a concatenation
+            self.dest_folders = {category: os.path.join(scan_path, f"Downloaded {category}") for category in CATEGORIES}
+        except Exception as e:
+            self.finish_scan(e)
+            return
 
-                    elif entry.is_dir():
-                        # Handle folders
-                        self.move_item(item_path, scan_path, is_folder=True)
+        self.scan_button.config(state=tk.DISABLED)  # One scan at a time
+        threading.Thread(target=self.scan_directory, args=(scan_path, cutoff, expiry_categories),
+                         daemon=True).start()
 
-            self.log_action("=== File and Folder Organization Completed ===\n")
-            messagebox.showinfo("Process Complete", "File and folder organization has finished successfully.")
+    def scan_directory(self, scan_path, cutoff, expiry_categories):
+        """Lists and categorizes the directory and checks which files expired, on a worker thread."""
+        try:
+            skip_names = self.skip_names
+            # Scanning the folder that holds the logs (the home folder) must not move the open log away
+            if os.path.normcase(os.path.abspath(scan_path)) == os.path.normcase(os.path.dirname(LOG_DIR)):
+                skip_names = skip_names | {os.path.basename(LOG_DIR)}
+            # Bound once as locals: used for every file
+            ext_to_category = self.ext_to_category
+            file_has_expired = self.file_has_expired
+            files = []  # (entry, category, modification time if expired else None) triples
+            folders = []
+
+            # Classify each entry once, as it is read; the directory handle is closed before any pop-up
+            with os.scandir(scan_path) as it:
+                for entry in it:
+                    # Leave the destination folders (and the log folder) where they are
+                    if entry.name in skip_names:
+                        continue
+
+                    # follow_symlinks=False answers from the directory listing alone (no stat per entry)
+                    if entry.is_file(follow_symlinks=False):
+                        # Categorize first (name only), so files in unchecked categories are never stat'ed.
+                        # The name has no directory part, so the last dot is enough (a leading dot means hidden)
+                        name = entry.name
+                        dot = name.rfind('.')
+                        category = ext_to_category.get(name[dot:].lower() if dot > 0 else '', DEFAULT_CATEGORY)
+                        expired_time = None
+                        if category in expiry_categories:
+                            expired, last_modified_time = file_has_expired(entry, cutoff)
+                            if expired:
+                                expired_time = last_modified_time
+                        files.append((entry, category, expired_time))
+
+                    elif entry.is_dir(follow_symlinks=False):
+                        folders.append(entry)
+
+                    elif entry.is_symlink():
+                        # Leave links alone rather than sorting them by whatever they point to
+                        self.log_action(f"Skipped symbolic link: {entry.path}")
+
+        except Exception as e:
+            self.root.after(0, self.finish_scan, e)
+            return
+
+        # Pop-ups and widget reads have to happen on the Tk thread
+        self.root.after(0, self.review_items, files, folders)
+
+    def review_items(self, files, folders):
+        """Asks about expired files and picks every item's destination, on the Tk thread."""
+        try:
+            dest_folders = self.dest_folders  # Bound once as a local: looked up for every item
+
+            # Ask about every inactive file at once rather than one pop-up each
+            expired_files = [(entry, expired_time) for entry, _, expired_time in files if expired_time is not None]
+            deleted = self.show_popup(expired_files) if expired_files else set()
+            deletions = [entry.path for entry, _ in expired_files if entry.path in deleted]
+            for entry, _ in expired_files:
+                if entry.path not in deleted:
+                    self.log_action(f"Kept: {entry.path}")
+
+            moves = []
+            for entry, category, _ in files:
+                # Handle files
+                if entry.path in deleted:
+                    continue  # Skip moving if deleted
+                moves.append((entry.path, entry.name, dest_folders[category], False))
+
+            for entry in folders:
+                # Handle folders
+                moves.append((entry.path, entry.name, dest_folders[FOLDERS_CATEGORY], True))
+
+        except Exception as e:
+            self.finish_scan(e)
+            return
+
+        threading.Thread(target=self.move_items, args=(deletions, moves), daemon=True).start()
+
+    def move_items(self, deletions, moves):
+        """Trashes the chosen files and moves every (path, name, destination folder, is folder) item.
+
+        Runs on a worker thread, as do delete_files and move_item under it, so none may touch Tk widgets or variables.
+        """
+        try:
+            # The moves are independent I/O, so overlap them on a bounded thread pool. The deletions go to
+            # the Recycle Bin as one batch on a single pool thread while the other threads rename files.
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 2)) as executor:
+                deleting = executor.submit(self.delete_files, deletions)
+                list(executor.map(lambda move: self.move_item(*move), moves))
+                deleting.result()
 
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+            self.root.after(0, self.finish_scan, e)
+            return
+
+        self.root.after(0, self.finish_scan, None)
+
+    def finish_scan(self, error):
+        """Closes the log and reports how the scan ended, on the Tk thread."""
+        if error is None:
+            self.log_action("=== File and Folder Organization Completed ===\n")
+        self.close_log()  # Write the log out before the dialog blocks
+        self.scan_button.config(state=tk.NORMAL)
+
+        if error is None:
+            messagebox.showinfo("Process Complete", "File and folder organization has finished successfully.")
+        else:
+            messagebox.showerror("Error", f"An error occurred: {error}")
 
 
 # === RUN THE PROGRAM ===